@@ -1,32 +1,44 @@
+import asyncio
 import logging
 import os
 import random
+from typing import AsyncIterable, Optional
 from dotenv import load_dotenv
 
+from livekit import rtc
 from livekit.agents import (
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,
+    tokenize,
 )
+from livekit.agents.llm import ChatContext, ChatMessage, StopResponse
 from livekit.agents.voice import Agent, AgentSession
-from livekit.plugins import openai, silero, murf
+from livekit.plugins import deepgram, openai, silero, murf
 
 load_dotenv()
 logger = logging.getLogger("improv-host")
 logger.setLevel(logging.INFO)
+MURF_API_KEY = os.getenv("MURF_API_KEY")
 
 # --- SCENARIOS ---
-SCENARIOS = [
+SCENARIOS = (
     "You are a barista telling a customer their latte is a portal to another dimension.",
     "You are a time-traveler explaining TikTok to a medieval peasant.",
     "You are a cat trying to explain quantum physics to a dog.",
     "You are a superhero whose only power is turning things into soup.",
     "You are a tour guide at a museum for 'Haunted Furniture'."
-]
+)
+
+# Full Round 1 announcements, built once
+SCENARIO_LINES = tuple(
+    f"Fantastic! Round 1. Here is your scenario: {scene}. ... ACTION!" for scene in SCENARIOS
+)
 
 # --- THE AGENT ---
 class ImprovHost(Agent):
-    def __init__(self):
+    def __init__(self, vad: silero.VAD):
         super().__init__(
             instructions="""You are the energetic host of 'Improv Battle'.
             
@@ -39,8 +51,11 @@ class ImprovHost(Agent):
             TONE: Witty, loud, game-show style.
             """,
             
-            # HEARING: OpenAI Whisper (Robust for your network)
-            stt=openai.STT(),
+            # HEARING: Deepgram streaming, transcribes while the player is still performing
+            stt=deepgram.STT(
+                model="nova-2-general",
+                language="en-US"
+            ),
             
             # BRAIN: OpenAI GPT-4o-mini
             llm=openai.LLM(model="gpt-4o-mini"),
@@ -48,40 +63,78 @@ class ImprovHost(Agent):
             # VOICE: Murf Falcon (Challenge Requirement)
             tts=murf.TTS(
                 model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
+                encoding="pcm",
+                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+                api_key=MURF_API_KEY
             ),
             
-            vad=silero.VAD.load(min_speech_duration=0.1)
+            vad=vad
         )
         self.round = 0
+        self._scenario_line = random.choice(SCENARIO_LINES)
+        self._pre_tts: Optional[asyncio.Task[list[rtc.AudioFrame]]] = None
 
     async def on_enter(self) -> None:
+        # Synthesize this session's Round 1 intro while the greeting plays, so the
+        # scenario can be spoken without a TTS round-trip
+        self._pre_tts = asyncio.create_task(self._synthesize(self._scenario_line))
         await self.session.say("Ladies and gentlemen! Welcome to the Grand Finale... IMPROV BATTLE! Are you ready to perform?")
 
-    # Override text handler to drive the game via chat
-    async def on_user_speech(self, text: str):
-        # If they say yes/ready/start, start Round 1
+    async def on_exit(self) -> None:
+        if self._pre_tts is not None:
+            self._pre_tts.cancel()
+
+    async def _synthesize(self, text: str) -> list[rtc.AudioFrame]:
+        frames = []
+        try:
+            async with self.tts.synthesize(text) as stream:
+                async for audio in stream:
+                    frames.append(audio.frame)
+        except Exception as e:
+            # An empty result makes the caller fall back to live TTS
+            logger.warning(f"Pre-synthesizing the scenario failed: {e}")
+            return []
+        return frames
+
+    @staticmethod
+    async def _play(frames: list[rtc.AudioFrame]) -> AsyncIterable[rtc.AudioFrame]:
+        for frame in frames:
+            yield frame
+
+    async def on_user_turn_completed(self, turn_ctx: ChatContext, new_message: ChatMessage) -> None:
+        # Their first answer (yes/ready/start) starts Round 1 with the pre-synthesized intro
         if self.round == 0:
             self.round = 1
-            scene = random.choice(SCENARIOS)
-            await self.session.say(f"Fantastic! Round 1. Here is your scenario: {scene}. ... ACTION!")
-            return
+            frames = await self._pre_tts if self._pre_tts else None
+            if frames:
+                await self.session.say(self._scenario_line, audio=self._play(frames))
+            else:
+                await self.session.say(self._scenario_line)
+            raise StopResponse()
 
         # If they are performing (Round > 0), the LLM handles the critique naturally.
         # We just log it here.
-        print(f"User performed: {text}")
+        print(f"User performed: {new_message.text_content}")
+
+def prewarm(proc: JobProcess):
+    """Load the VAD before a room is assigned, off the first-turn critical path"""
+    # The silence window is a little longer than default since endpointing adds almost no delay
+    proc.userdata["vad"] = silero.VAD.load(min_speech_duration=0.1, min_silence_duration=0.8)
 
 async def entrypoint(ctx: JobContext):
     await ctx.connect(auto_subscribe=True)
     
     # 1. Create the Agent
-    agent = ImprovHost()
+    agent = ImprovHost(vad=ctx.proc.userdata["vad"])
     
-    # 2. Create the Session (Empty init to prevent TypeError)
-    session = AgentSession()
+    # 2. Create the Session, overlapping LLM inference with end-of-turn detection
+    session = AgentSession(
+        preemptive_generation=True,
+        min_endpointing_delay=0.05,
+    )
     
     # 3. Start the session (Passing the agent here works on all versions)
     await session.start(agent=agent, room=ctx.room)
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
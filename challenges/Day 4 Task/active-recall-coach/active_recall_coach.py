@@ -4,14 +4,18 @@ Using Murf Falcon TTS for the fastest text-to-speech generation
 FIXED: Voice input now properly processes audio
 """
 
+import asyncio
 import logging
 import os
+import re
 import sys
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Optional
+from functools import partial
+from typing import AsyncIterable, Callable, Optional
 from dotenv import load_dotenv
-from livekit.agents import JobContext, WorkerOptions, cli
-from livekit.agents.llm import function_tool
+from livekit.agents import JobContext, JobProcess, WorkerOptions, cli, tokenize
+from livekit.agents.llm import ChatContext, ChatMessage, StopResponse, function_tool
 from livekit.agents.voice import Agent, AgentSession, RunContext
 from livekit.plugins import deepgram, openai, silero, murf
 
@@ -31,64 +35,218 @@ logging.getLogger("livekit.plugins").setLevel(logging.DEBUG)
 
 # Load environment variables immediately
 load_dotenv()
+MURF_API_KEY = os.getenv("MURF_API_KEY")
+
+# Most recent entries kept per session
+MAX_CONCEPTS = 32
+MAX_SESSION_NOTES = 64
 
 @dataclass
 class SessionData:
     """Stores learning session data across agent transfers"""
     topic: Optional[str] = None
     difficulty_level: str = "beginner"
-    concepts_covered: list[str] = field(default_factory=list)
+    # Bounded so long sessions keep memory and summaries stable
+    concepts_covered: deque[str] = field(default_factory=lambda: deque(maxlen=MAX_CONCEPTS))
     recall_attempts: int = 0
     correct_recalls: int = 0
-    session_notes: list[str] = field(default_factory=list)
-    personas: dict[str, Agent] = field(default_factory=dict)
+    session_notes: deque[str] = field(default_factory=lambda: deque(maxlen=MAX_SESSION_NOTES))
+    # Agents, or factories for agents that are built on their first transfer
+    personas: dict[str, Agent | Callable[[], Agent]] = field(default_factory=dict)
     prev_agent: Optional[Agent] = None
+    seen_ids: dict[str, set[str]] = field(default_factory=dict)
     ctx: Optional[JobContext] = None
+    # Memoized (key, text) pairs, recomputed lazily when the key changes
+    _summary_cache: Optional[tuple[tuple, str]] = field(default=None, init=False, repr=False)
+    _performance_cache: Optional[tuple[tuple, str]] = field(default=None, init=False, repr=False)
+    # Last "agent" participant attribute published to the room
+    _last_agent_attr: Optional[str] = field(default=None, init=False, repr=False)
+
+    def _summary_key(self) -> tuple:
+        return (
+            self.recall_attempts,
+            self.correct_recalls,
+            self.topic,
+            self.difficulty_level,
+            len(self.concepts_covered),
+        )
+
+    def _accuracy(self) -> float:
+        return (self.correct_recalls / self.recall_attempts * 100) if self.recall_attempts > 0 else 0
 
     def summarize(self) -> str:
-        accuracy = (self.correct_recalls / self.recall_attempts * 100) if self.recall_attempts > 0 else 0
-        return f"Topic: {self.topic}, Level: {self.difficulty_level}, Concepts: {len(self.concepts_covered)}, Accuracy: {accuracy:.1f}%"
+        key = self._summary_key()
+        if self._summary_cache and self._summary_cache[0] == key:
+            return self._summary_cache[1]
+
+        summary = f"Topic: {self.topic}, Level: {self.difficulty_level}, Concepts: {len(self.concepts_covered)}, Accuracy: {self._accuracy():.1f}%"
+        self._summary_cache = (key, summary)
+        return summary
 
     def get_performance_summary(self) -> str:
-        accuracy = (self.correct_recalls / self.recall_attempts * 100) if self.recall_attempts > 0 else 0
-        return f"""
+        key = self._summary_key()
+        if self._performance_cache and self._performance_cache[0] == key:
+            return self._performance_cache[1]
+
+        summary = f"""
         📊 Session Performance:
         - Topic: {self.topic}
         - Difficulty: {self.difficulty_level}
         - Concepts Covered: {len(self.concepts_covered)}
         - Recall Attempts: {self.recall_attempts}
         - Correct Recalls: {self.correct_recalls}
-        - Accuracy: {accuracy:.1f}%
+        - Accuracy: {self._accuracy():.1f}%
         """
+        self._performance_cache = (key, summary)
+        return summary
 
 RunContext_T = RunContext[SessionData]
 
+# Label for the per-transfer session state message appended to the chat context
+SESSION_STATE_TAG = "[SESSION_STATE]"
+
+# Knowledge levels accepted by the Intake Agent
+DIFFICULTY_LEVELS = ("beginner", "intermediate", "advanced")
+# Only a bare level word ("Beginner.", "advanced!") is unambiguous enough to skip the LLM;
+# anything longer, negated or asked as a question goes through the normal turn
+_LEVEL_PATTERN = re.compile(r"\s*(beginner|intermediate|advanced)[\s.!]*", re.IGNORECASE)
+
+# Shared opening block of every agent's instructions. It is identical for all
+# four agents, so OpenAI's prompt cache can reuse it across agent transfers.
+COMMON_PREAMBLE = """You are part of the Active Recall Learning Coach, a voice-based tutoring system made of four cooperating agents that hand a single student back and forth during one learning session.
+
+🧭 The Four Agents:
+1. Intake Agent - greets the student, explains active recall in one sentence, and records the topic and the knowledge level (beginner, intermediate, or advanced).
+2. Teaching Agent - teaches two or three key concepts of the chosen topic at the recorded level and records every concept it covers.
+3. Recall Testing Agent - asks open-ended questions about the concepts that were taught, evaluates each answer, and records every attempt as correct or incorrect.
+4. Feedback Agent - summarizes the session, celebrates progress, recommends a spaced review schedule, and offers the next step.
+
+🔁 Session Flow:
+- Every session starts with the Intake Agent.
+- The normal order is Intake, then Teaching, then Recall Testing, then Feedback.
+- Recall Testing may send the student back to Teaching when concepts need reinforcement.
+- Feedback may send the student back to Teaching to go deeper, or back to Intake to start a new topic.
+- Only transfer by calling the matching transfer tool. Never pretend a transfer happened.
+- After a transfer, the conversation so far is carried over. Continue naturally from it and do not repeat questions that were already answered.
+
+📋 Session State:
+- The latest session state is provided in a system message that starts with """ + SESSION_STATE_TAG + """.
+- It lists the topic, the difficulty level, the number of concepts covered, and the current recall accuracy.
+- Always trust the most recent session state message over anything said earlier in the conversation.
+- Never read the session state out verbatim; use it to personalize what you say.
+
+🎚️ Difficulty Levels (shared meaning for every agent):
+- Beginner: the student is new to the topic. Use everyday language, simple analogies, and define every term before using it.
+- Intermediate: the student knows the basics. Focus on how and why things work and connect ideas to the wider subject.
+- Advanced: the student is comfortable with the fundamentals. Discuss nuances, edge cases, trade-offs, and open questions.
+- Match your vocabulary, pace, and question difficulty to the recorded level, and adjust if the student is clearly struggling or clearly bored.
+
+🧠 Active Recall Science (shared knowledge for every agent):
+- Active recall means retrieving information from memory instead of re-reading it.
+- Each retrieval strengthens the memory trace, much like exercising a muscle.
+- Testing yourself is two to three times more effective than passive review.
+- Struggling to remember is a desirable difficulty: the effort itself improves long-term retention.
+- Mistakes made during recall are valuable because they reveal gaps and make the correction more memorable.
+- Spacing reviews over increasing intervals (one day, three days, one week) locks information into long-term memory.
+- Explaining an idea in your own words, as in the Feynman Technique, exposes what you do not yet understand.
+
+🗣️ Voice Conversation Rules:
+- The student hears everything you say through text-to-speech, so write for the ear, not the eye.
+- Keep each turn short: two to four sentences unless you are teaching a concept or giving the final summary.
+- Never use markdown, bullet symbols, tables, code blocks, or emojis in what you say.
+- Spell out symbols and abbreviations the way a person would say them.
+- Ask one question at a time and then stop talking so the student can answer.
+- If the student's answer is unclear or sounds cut off, ask them to repeat it instead of guessing.
+- If the student goes off topic, answer briefly and guide them back to the session.
+
+🤝 Tone for Every Agent:
+- Warm, encouraging, and patient, like a supportive personal tutor.
+- Enthusiastic about learning without being over the top.
+- Honest about mistakes while always framing them as progress.
+- Professional yet friendly, and never condescending.
+
+🛠️ Tool Rules:
+- Record information with the provided tools as soon as the student gives it.
+- Only record what the student actually said or demonstrated; never invent topics, concepts, or results.
+- If a tool tells you something is missing, ask the student for it before trying again.
+- Do not mention tool names or internal agent names unless you are announcing a transfer.
+
+👋 Ending a Session:
+- If the student wants to stop at any point, thank them warmly and remind them to review what they learned within a day.
+- Never end the conversation abruptly or while the student is still answering a question.
+- The full session summary is given by the Feedback Agent, so other agents should keep goodbyes brief."""
+
+ROLE_INSTRUCTIONS_HEADER = "\n\n### ROLE-SPECIFIC INSTRUCTIONS ###\n"
+
+
+def _instructions(role_instructions: str) -> str:
+    """Build an agent's instructions as the shared preamble plus its role block"""
+    return COMMON_PREAMBLE + ROLE_INSTRUCTIONS_HEADER + role_instructions
+
+
+async def _paragraphs(text: str) -> AsyncIterable[str]:
+    """Yield non-empty paragraphs of text for incremental TTS synthesis"""
+    for paragraph in text.split("\n\n"):
+        if paragraph.strip():
+            yield paragraph + "\n\n"
+
+def _components(plugins: dict) -> dict:
+    """Pick the shared pipeline plugins out of the prewarmed process userdata"""
+    return {name: plugins[name] for name in ("stt", "llm", "tts", "vad")}
+
+
 class BaseAgent(Agent):
     """Base agent with shared functionality for context management"""
-    
+
     async def on_enter(self) -> None:
         agent_name = self.__class__.__name__
         logger.info(f"🎤 {agent_name} - ENTERING AND READY")
 
         userdata: SessionData = self.session.userdata
-        if userdata.ctx and userdata.ctx.room:
-            await userdata.ctx.room.local_participant.set_attributes({"agent": agent_name})
 
+        # The agent's chat context is read-only, so a shallow copy is still needed
         chat_ctx = self.chat_ctx.copy()
 
+        # Keep a persistent per-agent id set instead of rebuilding one on
+        # every transfer, and append new items without a filtered list copy
+        seen_ids = userdata.seen_ids.setdefault(agent_name, set())
+        seen_ids.update(item.id for item in chat_ctx.items)
+
         if userdata.prev_agent:
-            items_copy = self._truncate_chat_ctx(
+            for item in self._truncate_chat_ctx(
                 userdata.prev_agent.chat_ctx.items, keep_function_call=True
-            )
-            existing_ids = {item.id for item in chat_ctx.items}
-            items_copy = [item for item in items_copy if item.id not in existing_ids]
-            chat_ctx.items.extend(items_copy)
+            ):
+                if item.id not in seen_ids:
+                    seen_ids.add(item.id)
+                    chat_ctx.items.append(item)
 
+        # Keep the instructions as a static, cacheable prefix and put the
+        # mutable session state last, after all carried-over history
         chat_ctx.add_message(
             role="system",
-            content=f"You are the {agent_name}. Session info: {userdata.summarize()}"
+            content=f"{SESSION_STATE_TAG}\n{userdata.summarize()}"
         )
-        await self.update_chat_ctx(chat_ctx)
+
+        # The attribute RPC and the chat context update are independent, so
+        # run them together. Skip the RPC when the room already shows this agent.
+        update_attr = bool(
+            userdata.ctx and userdata.ctx.room and userdata._last_agent_attr != agent_name
+        )
+        pending = [self.update_chat_ctx(chat_ctx)]
+        if update_attr:
+            pending.append(
+                userdata.ctx.room.local_participant.set_attributes({"agent": agent_name})
+            )
+        results = await asyncio.gather(*pending, return_exceptions=True)
+
+        if isinstance(results[0], BaseException):
+            raise results[0]
+        if update_attr:
+            # Only remember the attribute once the room has actually accepted it
+            if isinstance(results[1], BaseException):
+                logger.warning(f"Failed to publish agent attribute for {agent_name}: {results[1]}")
+            else:
+                userdata._last_agent_attr = agent_name
         
         # CRITICAL FIX: Force the agent to generate its first message
         logger.info(f"🔊 {agent_name} - Generating initial greeting")
@@ -108,33 +266,44 @@ class BaseAgent(Agent):
                 return False
             return True
 
-        new_items = []
-        for item in reversed(items):
-            if _valid_item(item):
-                new_items.append(item)
-            if len(new_items) >= keep_last_n_messages:
-                break
-        new_items = new_items[::-1]
+        # Walk back to where the last N valid items start
+        start = len(items)
+        count = 0
+        while start > 0 and count < keep_last_n_messages:
+            start -= 1
+            if _valid_item(items[start]):
+                count += 1
 
-        while new_items and new_items[0].type in ["function_call", "function_call_output"]:
-            new_items.pop(0)
+        # Single forward pass over the tail, dropping leading function calls
+        new_items = []
+        for item in items[start:]:
+            if not _valid_item(item):
+                continue
+            if not new_items and item.type in ("function_call", "function_call_output"):
+                continue
+            new_items.append(item)
 
         return new_items
 
-    async def _transfer_to_agent(self, name: str, context: RunContext_T) -> Agent:
-        userdata = context.userdata
-        current_agent = context.session.current_agent
+    def _transfer_to_agent(self, name: str, context: RunContext_T) -> Agent:
+        return self._switch_persona(name, context.userdata, context.session.current_agent)
+
+    def _switch_persona(self, name: str, userdata: SessionData, current_agent: Agent) -> Agent:
         next_agent = userdata.personas[name]
+        if not isinstance(next_agent, Agent):
+            next_agent = next_agent()
+            userdata.personas[name] = next_agent
         userdata.prev_agent = current_agent
         return next_agent
 
 
 class IntakeAgent(BaseAgent):
     """Initial agent that sets up the learning session"""
-    
-    def __init__(self) -> None:
+
+    def __init__(self, plugins: dict) -> None:
+        self._level_recorded = False
         super().__init__(
-            instructions="""You are the Intake Agent for the Active Recall Learning Coach.
+            instructions=_instructions("""You are the Intake Agent for the Active Recall Learning Coach.
             
             **IMPORTANT: When you first enter, IMMEDIATELY greet the student! Say "Hello! I'm your Active Recall Learning Coach" and introduce yourself right away.**
             
@@ -158,20 +327,8 @@ class IntakeAgent(BaseAgent):
             - Enthusiastic about learning
             - Professional yet friendly
             
-            **Remember: Greet them immediately when entering!**""",
-            stt=deepgram.STT(
-                model="nova-2-general",
-                language="en-US"
-            ),
-            llm=openai.LLM(model="gpt-4o-mini"),
-            tts=murf.TTS(
-                model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
-            ),
-            vad=silero.VAD.load(
-                min_speech_duration=0.2,      # Detect speech quickly
-                min_silence_duration=1.5,     # Wait longer before cutting off
-            )
+            **Remember: Greet them immediately when entering!**"""),
+            **_components(plugins)
         )
 
     @function_tool
@@ -182,16 +339,53 @@ class IntakeAgent(BaseAgent):
         logger.info(f"Topic recorded: {topic}")
         return f"Perfect! I've recorded that you want to learn about {topic}. This is an excellent choice!"
 
+    async def on_enter(self) -> None:
+        self._level_recorded = False
+        await super().on_enter()
+
+    async def on_user_turn_completed(self, turn_ctx: ChatContext, new_message: ChatMessage) -> None:
+        """Record an explicitly named knowledge level locally and skip the LLM turn"""
+        userdata: SessionData = self.session.userdata
+        if not userdata.topic or self._level_recorded:
+            return
+
+        match = _LEVEL_PATTERN.fullmatch(new_message.text_content or "")
+        if not match:
+            return
+
+        self._set_difficulty_level(userdata, match.group(1).lower())
+        # StopResponse drops the turn, so commit the answer before the handoff
+        # line; the teaching agent then inherits both from this chat context
+        chat_ctx = self.chat_ctx.copy()
+        chat_ctx.items.append(new_message)
+        await self.update_chat_ctx(chat_ctx)
+        await self.session.say(self._teaching_handoff_message(userdata))
+        self.session.update_agent(
+            self._switch_persona("teaching", userdata, self.session.current_agent)
+        )
+        raise StopResponse()
+
+    def _set_difficulty_level(self, userdata: SessionData, level: str) -> None:
+        userdata.difficulty_level = level
+        userdata.session_notes.append(f"Level set: {level}")
+        self._level_recorded = True
+        logger.info(f"Difficulty level recorded: {level}")
+
+    @staticmethod
+    def _teaching_handoff_message(userdata: SessionData) -> str:
+        return (
+            f"Excellent! You're all set to learn about {userdata.topic} at the {userdata.difficulty_level} level. "
+            f"Let me transfer you to your Teaching Agent who will guide you through the learning process."
+        )
+
     @function_tool
     async def record_difficulty_level(self, context: RunContext_T, level: str) -> str:
         """Record the student's knowledge level (beginner, intermediate, or advanced)"""
         level = level.lower().strip()
-        if level not in ["beginner", "intermediate", "advanced"]:
+        if level not in DIFFICULTY_LEVELS:
             return "Please specify either beginner, intermediate, or advanced."
         
-        context.userdata.difficulty_level = level
-        context.userdata.session_notes.append(f"Level set: {level}")
-        logger.info(f"Difficulty level recorded: {level}")
+        self._set_difficulty_level(context.userdata, level)
         return f"Great! I've set your knowledge level as {level}."
 
     @function_tool
@@ -203,19 +397,16 @@ class IntakeAgent(BaseAgent):
         if not userdata.difficulty_level:
             return "I still need to know your knowledge level."
         
-        await self.session.say(
-            f"Excellent! You're all set to learn about {userdata.topic} at the {userdata.difficulty_level} level. "
-            f"Let me transfer you to your Teaching Agent who will guide you through the learning process."
-        )
-        return await self._transfer_to_agent("teaching", context)
+        await self.session.say(self._teaching_handoff_message(userdata))
+        return self._transfer_to_agent("teaching", context)
 
 
 class TeachingAgent(BaseAgent):
     """Agent that teaches concepts and prepares for recall"""
     
-    def __init__(self) -> None:
+    def __init__(self, plugins: dict) -> None:
         super().__init__(
-            instructions="""You are the Teaching Agent in the Active Recall Learning system.
+            instructions=_instructions("""You are the Teaching Agent in the Active Recall Learning system.
             
             **IMPORTANT: When you first enter, immediately welcome the student and start teaching!**
             
@@ -256,20 +447,8 @@ class TeachingAgent(BaseAgent):
             - Make content engaging and relatable
             - Ask comprehension questions periodically
             
-            After covering 2-3 key concepts, suggest testing their recall!""",
-            stt=deepgram.STT(
-                model="nova-2-general",
-                language="en-US"
-            ),
-            llm=openai.LLM(model="gpt-4o-mini"),
-            tts=murf.TTS(
-                model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
-            ),
-            vad=silero.VAD.load(
-                min_speech_duration=0.2,
-                min_silence_duration=1.5,
-            )
+            After covering 2-3 key concepts, suggest testing their recall!"""),
+            **_components(plugins)
         )
 
     @function_tool
@@ -296,7 +475,7 @@ class TeachingAgent(BaseAgent):
             "Remember, struggling to remember is actually beneficial - it strengthens your memory! "
             "Let me transfer you to the Recall Testing Agent."
         )
-        return await self._transfer_to_agent("recall", context)
+        return self._transfer_to_agent("recall", context)
 
     @function_tool
     async def transfer_to_intake(self, context: RunContext_T) -> Agent:
@@ -306,18 +485,18 @@ class TeachingAgent(BaseAgent):
         )
         # Reset for new session
         context.userdata.topic = None
-        context.userdata.concepts_covered = []
+        context.userdata.concepts_covered.clear()
         context.userdata.recall_attempts = 0
         context.userdata.correct_recalls = 0
-        return await self._transfer_to_agent("intake", context)
+        return self._transfer_to_agent("intake", context)
 
 
 class RecallTestingAgent(BaseAgent):
     """Agent that tests student's recall and provides feedback"""
     
-    def __init__(self) -> None:
+    def __init__(self, plugins: dict) -> None:
         super().__init__(
-            instructions="""You are the Recall Testing Agent in the Active Recall Learning system.
+            instructions=_instructions("""You are the Recall Testing Agent in the Active Recall Learning system.
             
             **IMPORTANT: When you first enter, immediately welcome them and start testing!**
             
@@ -356,20 +535,8 @@ class RecallTestingAgent(BaseAgent):
             - Mistakes reveal gaps that need attention
             - Each attempt improves retention
             
-            After 3-5 recall questions, transfer to the Feedback Agent for summary.""",
-            stt=deepgram.STT(
-                model="nova-2-general",
-                language="en-US"
-            ),
-            llm=openai.LLM(model="gpt-4o-mini"),
-            tts=murf.TTS(
-                model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
-            ),
-            vad=silero.VAD.load(
-                min_speech_duration=0.2,
-                min_silence_duration=1.5,
-            )
+            After 3-5 recall questions, transfer to the Feedback Agent for summary."""),
+            **_components(plugins)
         )
 
     @function_tool
@@ -398,7 +565,7 @@ class RecallTestingAgent(BaseAgent):
             "I can see some concepts would benefit from more review. "
             "Let me transfer you back to the Teaching Agent for reinforcement and deeper understanding."
         )
-        return await self._transfer_to_agent("teaching", context)
+        return self._transfer_to_agent("teaching", context)
 
     @function_tool
     async def transfer_to_feedback(self, context: RunContext_T) -> Agent:
@@ -411,15 +578,15 @@ class RecallTestingAgent(BaseAgent):
             "Great work on the recall practice! You've tested yourself on multiple concepts. "
             "Let me transfer you to the Feedback Agent who will provide a comprehensive session summary."
         )
-        return await self._transfer_to_agent("feedback", context)
+        return self._transfer_to_agent("feedback", context)
 
 
 class FeedbackAgent(BaseAgent):
     """Agent that provides session summary and learning recommendations"""
-    
-    def __init__(self) -> None:
+
+    def __init__(self, plugins: dict) -> None:
         super().__init__(
-            instructions="""You are the Feedback Agent in the Active Recall Learning system.
+            instructions=_instructions("""You are the Feedback Agent in the Active Recall Learning system.
             
             **IMPORTANT: When you first enter, immediately provide an encouraging summary of their session!**
             
@@ -464,20 +631,8 @@ class FeedbackAgent(BaseAgent):
             2. Start new topic (breadth)
             3. End session (come back later)
             
-            Make your feedback specific, actionable, and motivating!""",
-            stt=deepgram.STT(
-                model="nova-2-general",
-                language="en-US"
-            ),
-            llm=openai.LLM(model="gpt-4o-mini"),
-            tts=murf.TTS(
-                model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
-            ),
-            vad=silero.VAD.load(
-                min_speech_duration=0.2,
-                min_silence_duration=1.5,
-            )
+            Make your feedback specific, actionable, and motivating!"""),
+            **_components(plugins)
         )
 
     @function_tool
@@ -487,7 +642,7 @@ class FeedbackAgent(BaseAgent):
             "Excellent choice! Let's dive even deeper into this topic. "
             "I'm transferring you back to the Teaching Agent for more advanced concepts."
         )
-        return await self._transfer_to_agent("teaching", context)
+        return self._transfer_to_agent("teaching", context)
 
     @function_tool
     async def transfer_to_intake(self, context: RunContext_T) -> Agent:
@@ -500,12 +655,12 @@ class FeedbackAgent(BaseAgent):
         # Reset session data for new topic
         context.userdata.topic = None
         context.userdata.difficulty_level = "beginner"
-        context.userdata.concepts_covered = []
+        context.userdata.concepts_covered.clear()
         context.userdata.recall_attempts = 0
         context.userdata.correct_recalls = 0
-        context.userdata.session_notes = []
+        context.userdata.session_notes.clear()
         
-        return await self._transfer_to_agent("intake", context)
+        return self._transfer_to_agent("intake", context)
 
     @function_tool
     async def end_session(self, context: RunContext_T) -> str:
@@ -542,11 +697,40 @@ Keep practicing active recall, and watch your learning accelerate!
 Happy learning! 🌟
         """
         
-        await self.session.say(summary)
+        # Hand the summary to TTS paragraph by paragraph so audio starts after
+        # the first block instead of after the whole clip is synthesized
+        await self.session.say(_paragraphs(summary), allow_interruptions=True)
         logger.info(f"Session ended. {userdata.get_performance_summary()}")
         return "Session ended successfully"
 
 
+def prewarm(proc: JobProcess):
+    """Load shared plugins before a job is assigned, off the first-turn critical path.
+
+    Every agent reuses these instances, so agent transfers keep the same warm
+    connection pools instead of each agent opening its own.
+    """
+    proc.userdata["vad"] = silero.VAD.load(
+        min_speech_duration=0.2,      # Detect speech quickly
+        min_silence_duration=1.5,     # Wait longer before cutting off
+    )
+    proc.userdata["stt"] = deepgram.STT(
+        model="nova-2-general",
+        language="en-US"
+    )
+    proc.userdata["llm"] = openai.LLM(
+        model="gpt-4o-mini",
+        # Stable routing hint so every agent's requests land on the same prompt cache
+        prompt_cache_key="active-recall-coach",
+    )
+    proc.userdata["tts"] = murf.TTS(
+        model="FALCON",
+        encoding="pcm",
+        tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+        api_key=MURF_API_KEY
+    )
+
+
 async def entrypoint(ctx: JobContext):
     """Main entry point for the Active Recall Coach system"""
     
@@ -560,22 +744,26 @@ async def entrypoint(ctx: JobContext):
     # Initialize session data
     userdata = SessionData(ctx=ctx)
     
-    # Create all specialized agents
-    intake_agent = IntakeAgent()
-    teaching_agent = TeachingAgent()
-    recall_agent = RecallTestingAgent()
-    feedback_agent = FeedbackAgent()
+    # Only the Intake Agent is needed up front; the others are built on first transfer
+    plugins = ctx.proc.userdata
+    intake_agent = IntakeAgent(plugins)
 
     # Register all agents for cross-agent transfers
     userdata.personas.update({
         "intake": intake_agent,
-        "teaching": teaching_agent,
-        "recall": recall_agent,
-        "feedback": feedback_agent
+        "teaching": partial(TeachingAgent, plugins),
+        "recall": partial(RecallTestingAgent, plugins),
+        "feedback": partial(FeedbackAgent, plugins)
     })
 
     # Create the session with typed userdata
-    session = AgentSession[SessionData](userdata=userdata)
+    session = AgentSession[SessionData](
+        userdata=userdata,
+        # Let the LLM start on a reply while end-of-turn is still being confirmed
+        preemptive_generation=True,
+        # VAD already waits 1.5s of silence, so no extra endpointing delay on top
+        min_endpointing_delay=0.05,
+    )
 
     # Start with the Intake Agent
     logger.info("🎬 Starting session with Intake Agent - should greet immediately")
@@ -599,6 +787,7 @@ if __name__ == "__main__":
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
             ws_url=livekit_url,
             api_key=livekit_api_key,
             api_secret=livekit_api_secret
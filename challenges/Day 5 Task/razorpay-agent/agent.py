@@ -1,15 +1,24 @@
+import asyncio
+import hashlib
+import json
 import logging
 import os
-from typing import Annotated
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Annotated, AsyncIterable, Optional
+import numpy as np
 from dotenv import load_dotenv
-from livekit.agents import JobContext, WorkerOptions, cli
-from livekit.agents.llm import function_tool
-from livekit.agents.voice import Agent, AgentSession, RunContext
+from livekit.agents import JobContext, JobProcess, WorkerOptions, cli, tokenize
+from livekit.agents.llm import ChatChunk, ChatContext, function_tool
+from livekit.agents.voice import Agent, AgentSession, ModelSettings, RunContext
 from livekit.plugins import deepgram, silero, openai, murf
 
 load_dotenv()
 logger = logging.getLogger("faq-sdr-agent")
 logger.setLevel(logging.INFO)
+MURF_API_KEY = os.getenv("MURF_API_KEY")
 
 # --- 1. RAZORPAY KNOWLEDGE BASE ---
 FAQ_DATA = {
@@ -19,52 +28,290 @@ FAQ_DATA = {
     "settlement": "Settlements happen within T+2 working days directly to your bank account.",
 }
 
-def format_faq_context():
-    return "\n".join([f"{k.upper()}: {v}" for k, v in FAQ_DATA.items()])
+# Formatted once at import; dict order is insertion order, so the prompt is byte-stable
+FAQ_CONTEXT = "\n".join(f"{k.upper()}: {v}" for k, v in FAQ_DATA.items())
+_KNOWLEDGE_MESSAGE = f"KNOWLEDGE BASE:\n{FAQ_CONTEXT}"
 
-# --- 2. SESSION DATA ---
+# Built once and shared by every RazorpaySDR, so each session sends a byte-identical prompt
+_INSTRUCTIONS = """You are Rhea, a friendly Sales Representative for Razorpay (Indian Fintech).
+
+GOAL: Answer questions and capture leads.
+
+RULES:
+1. Keep answers short (1-2 sentences).
+2. Use Indian English phrasing (Namaste, etc.).
+3. If they ask about pricing or products, answer and then ask: 'Would you like to sign up?'
+4. If they say YES, ask for their Name and Business Type.
+5. Use the 'capture_lead' tool to save their info.
+6. Answer product questions from the KNOWLEDGE BASE message.
+"""
+
+def _knowledge_ctx() -> ChatContext:
+    """Static background as its own system message right after the instructions,
+    so OpenAI's prefix cache covers it and only new turns are encoded"""
+    ctx = ChatContext.empty()
+    ctx.add_message(role="system", content=_KNOWLEDGE_MESSAGE)
+    return ctx
+
+# --- 2. SEMANTIC REPLY CACHE ---
+# Answers only change when the prompt does, so it scopes the cache
+KNOWLEDGE_HASH = hashlib.sha256((_INSTRUCTIONS + _KNOWLEDGE_MESSAGE).encode()).hexdigest()[:16]
+
+# Conversation turns before the new question that must match for a cached reply to be reused
+CONTEXT_TURNS = 4
+
+def _context_hash(chat_ctx: ChatContext) -> str:
+    """Hash the last few user/assistant turns before the latest user message"""
+    turns = [
+        f"{item.role}: {item.text_content}"
+        for item in chat_ctx.items[:-1]
+        if item.type == "message" and item.role in ("user", "assistant")
+    ][-CONTEXT_TURNS:]
+    return hashlib.sha256("\n".join(turns).encode()).hexdigest()[:16]
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Words the prompt itself supplies; anything else a caller says may identify them
+_PROMPT_WORDS = frozenset(_WORD.findall((_INSTRUCTIONS + _KNOWLEDGE_MESSAGE).lower()))
+
+def _echoes_caller(user_text: str, reply: str) -> bool:
+    """True if the reply repeats a word the caller said that the prompt does not
+    contain, such as their name or business, so it must not be replayed to others"""
+    caller_words = set(_WORD.findall(user_text.lower())) - _PROMPT_WORDS
+    return not caller_words.isdisjoint(_WORD.findall(reply.lower()))
+
+class SemanticReplyCache:
+    """Ring buffer of (user embedding -> assistant reply) for near-duplicate questions,
+    kept in a sqlite file because each job process only serves one session"""
+
+    def __init__(self, path: str, max_entries: int = 256, threshold: float = 0.92):
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=5)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS replies ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, embedding BLOB NOT NULL, reply TEXT NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS replies_scope ON replies (scope)")
+        return conn
+
+    def lookup(self, scope: str, embedding: np.ndarray) -> Optional[str]:
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT embedding, reply FROM replies WHERE scope = ?", (scope,)).fetchall()
+        finally:
+            conn.close()
+
+        best_reply, best_score = None, self.threshold
+        for blob, reply in rows:
+            score = float(np.dot(np.frombuffer(blob, dtype=np.float32), embedding))
+            if score >= best_score:
+                best_reply, best_score = reply, score
+        return best_reply
+
+    def store(self, scope: str, embedding: np.ndarray, reply: str) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO replies (scope, embedding, reply) VALUES (?, ?, ?)",
+                (scope, embedding.astype(np.float32).tobytes(), reply),
+            )
+            # Drop the oldest rows past max_entries
+            conn.execute(
+                "DELETE FROM replies WHERE id <= (SELECT MAX(id) FROM replies) - ?", (self.max_entries,)
+            )
+        finally:
+            conn.close()
+
+# Shared by every job process of this worker
+_REPLY_CACHE = SemanticReplyCache(
+    os.getenv("REPLY_CACHE_DB", str(Path(__file__).parent / "reply_cache.sqlite3"))
+)
+
+async def _embed(text: str) -> np.ndarray:
+    """Embed a user turn as a unit-length vector so a dot product is cosine similarity"""
+    data = await openai.create_embeddings(input=[text.strip().lower()], model="text-embedding-3-small")
+    embedding = np.asarray(data[0].embedding, dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+# --- 3. CALLER MEMORY ---
+# Small structured record per caller ({"leads": [...]}) so a returning lead
+# is summarised in one system message instead of being asked again
+MEMORY_DB = os.getenv("MEMORI_DB", str(Path(__file__).parent / "memori.sqlite3"))
+
+def _memory_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect(MEMORY_DB, isolation_level=None)
+    conn.execute("CREATE TABLE IF NOT EXISTS memori (caller_id TEXT PRIMARY KEY, memory TEXT NOT NULL)")
+    return conn
+
+def _load_memory(caller_id: str) -> dict:
+    """Return the caller's stored memory, or an empty dict for a new caller"""
+    conn = _memory_conn()
+    try:
+        row = conn.execute("SELECT memory FROM memori WHERE caller_id = ?", (caller_id,)).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row[0]) if row else {}
+
+def _remember_lead(caller_id: str, lead: dict) -> None:
+    """Append a captured lead to the caller's memory, keeping the latest five"""
+    conn = _memory_conn()
+    try:
+        # Read-modify-write under one write lock so concurrent sessions can't drop a lead
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT memory FROM memori WHERE caller_id = ?", (caller_id,)).fetchone()
+        memory = json.loads(row[0]) if row else {}
+        memory["leads"] = (memory.get("leads", []) + [lead])[-5:]
+        conn.execute(
+            "INSERT INTO memori (caller_id, memory) VALUES (?, ?) "
+            "ON CONFLICT(caller_id) DO UPDATE SET memory = excluded.memory",
+            (caller_id, json.dumps(memory)),
+        )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+def _memory_summary(memory: dict) -> str:
+    """One short system message instead of replaying earlier calls"""
+    leads = ", ".join(f"{lead['name']} ({lead['business']})" for lead in memory.get("leads", []))
+    return f"CALLER MEMORY: Returning caller, already signed up as {leads}. Do not ask for their details again."
+
+# --- 4. SESSION DATA ---
+@dataclass
 class SessionData:
-    leads: list = []
+    # Caller's SIP phone number; memory is skipped for callers without one
+    caller_id: Optional[str] = None
+    memory: dict = field(default_factory=dict)
+    leads: list = field(default_factory=list)
 
 RunContext_T = RunContext[SessionData]
 
-# --- 3. THE AGENT CLASS (Day 4 Style) ---
+# --- 5. THE AGENT CLASS (Day 4 Style) ---
 class RazorpaySDR(Agent):
-    def __init__(self):
+    def __init__(self, vad: silero.VAD):
         super().__init__(
-            instructions=f"""You are Rhea, a friendly Sales Representative for Razorpay (Indian Fintech).
-            
-            GOAL: Answer questions and capture leads.
-            
-            KNOWLEDGE BASE:
-            {format_faq_context()}
-            
-            RULES:
-            1. Keep answers short (1-2 sentences).
-            2. Use Indian English phrasing (Namaste, etc.).
-            3. If they ask about pricing or products, answer and then ask: 'Would you like to sign up?'
-            4. If they say YES, ask for their Name and Business Type.
-            5. Use the 'capture_lead' tool to save their info.
-            """,
-            # Using OpenAI STT because it is safer for hotspots
-            stt=openai.STT(),
+            instructions=_INSTRUCTIONS,
+            chat_ctx=_knowledge_ctx(),
+            # Streaming STT so the LLM can start on interim transcripts
+            stt=deepgram.STT(model="nova-2", interim_results=True),
             llm=openai.LLM(model="gpt-4o-mini"),
             # Murf Falcon TTS (Challenge Requirement)
             tts=murf.TTS(
                 model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
+                encoding="pcm",
+                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+                api_key=MURF_API_KEY
             ),
-            vad=silero.VAD.load(
-                min_speech_duration=0.1,
-                min_silence_duration=0.5
-            )
+            vad=vad
         )
 
     async def on_enter(self) -> None:
+        userdata: SessionData = self.session.userdata
+        if userdata.caller_id:
+            try:
+                userdata.memory = await asyncio.to_thread(_load_memory, userdata.caller_id)
+            except Exception as e:
+                logger.warning(f"Could not load caller memory: {e}")
+        if userdata.memory.get("leads"):
+            # Appended after the knowledge base so the cached prefix is unchanged
+            chat_ctx = self.chat_ctx.copy()
+            chat_ctx.add_message(role="system", content=_memory_summary(userdata.memory))
+            await self.update_chat_ctx(chat_ctx)
+
         # Send the initial greeting when the agent joins
         await self.session.say("Namaste! This is Rhea from Razorpay. How can I help your business today?")
 
-    # --- 4. LEAD CAPTURE TOOL ---
+    async def llm_node(
+        self,
+        chat_ctx: ChatContext,
+        tools: list,
+        model_settings: ModelSettings,
+    ) -> AsyncIterable[ChatChunk | str]:
+        """Serve repeated FAQ questions from the reply cache instead of the LLM"""
+        last_item = chat_ctx.items[-1] if chat_ctx.items else None
+        user_text = (
+            last_item.text_content
+            if last_item and last_item.type == "message" and last_item.role == "user"
+            else None
+        )
+        # Replies to a known lead are personal, so they are never served from or added to the cache
+        userdata = self.session.userdata
+        if not user_text or userdata.leads or userdata.memory.get("leads"):
+            async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+                yield chunk
+            return
+
+        # Short answers ("yes", a name) only mean the same thing after the same turns
+        scope = f"{KNOWLEDGE_HASH}:{_context_hash(chat_ctx)}"
+
+        # Look the turn up while the LLM request is already in flight, so a
+        # cache miss costs no more than the uncached path
+        lookup_task = asyncio.create_task(self._lookup_reply(scope, user_text))
+        llm_stream = Agent.default.llm_node(self, chat_ctx, tools, model_settings)
+        first_chunk = asyncio.ensure_future(llm_stream.__anext__())
+        try:
+            await asyncio.wait({lookup_task, first_chunk}, return_when=asyncio.FIRST_COMPLETED)
+
+            # A cached reply only wins if it is ready before the first LLM token
+            if lookup_task.done():
+                cached_reply = lookup_task.result()[1]
+                if cached_reply is not None:
+                    logger.info("💾 Serving cached reply")
+                    yield cached_reply
+                    return
+
+            reply_parts = []
+            has_tool_calls = False
+            try:
+                chunk = await first_chunk
+            except StopAsyncIteration:
+                return
+            while True:
+                if isinstance(chunk, ChatChunk) and chunk.delta:
+                    if chunk.delta.tool_calls:
+                        has_tool_calls = True
+                    if chunk.delta.content:
+                        reply_parts.append(chunk.delta.content)
+                yield chunk
+                try:
+                    chunk = await llm_stream.__anext__()
+                except StopAsyncIteration:
+                    break
+
+            # The cache is shared by every caller, so only generic answers are reused:
+            # lead capture goes through a tool call, and replies that repeat the
+            # caller's own details are personal
+            reply = "".join(reply_parts)
+            embedding = (await lookup_task)[0]
+            if embedding is not None and reply and not has_tool_calls and not _echoes_caller(user_text, reply):
+                try:
+                    await asyncio.to_thread(_REPLY_CACHE.store, scope, embedding, reply)
+                except Exception as e:
+                    logger.warning(f"Could not store reply in cache: {e}")
+        finally:
+            # On a cache hit or an interruption, drop whatever is still in flight
+            for task in (lookup_task, first_chunk):
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(lookup_task, first_chunk, return_exceptions=True)
+            await llm_stream.aclose()
+
+    async def _lookup_reply(self, scope: str, user_text: str) -> tuple[Optional[np.ndarray], Optional[str]]:
+        """Embed the user turn and find a cached reply; (None, None) if either step fails"""
+        try:
+            embedding = await _embed(user_text)
+        except Exception as e:
+            logger.warning(f"Reply cache embedding failed: {e}")
+            return None, None
+        try:
+            return embedding, await asyncio.to_thread(_REPLY_CACHE.lookup, scope, embedding)
+        except Exception as e:
+            logger.warning(f"Reply cache lookup failed: {e}")
+            return embedding, None
+
+    # --- 6. LEAD CAPTURE TOOL ---
     @function_tool
     async def capture_lead(
         self, 
@@ -74,23 +321,35 @@ class RazorpaySDR(Agent):
     ) -> str:
         """Capture lead details when the user wants to sign up."""
         
-        # Save to session memory
-        context.userdata.leads.append({"name": name, "business": business_type})
+        # Save to session memory, and to the caller's memori record for next time
+        lead = {"name": name, "business": business_type}
+        context.userdata.leads.append(lead)
+        if context.userdata.caller_id:
+            try:
+                await asyncio.to_thread(_remember_lead, context.userdata.caller_id, lead)
+            except Exception as e:
+                logger.warning(f"Could not save caller memory: {e}")
         
         logger.info(f"📝 NEW LEAD CAPTURED: {name} | {business_type}")
         
         return f"Thanks {name}. I have captured your details. Our team will call you shortly to finish the setup."
 
-# --- 5. ENTRYPOINT ---
+# --- 7. ENTRYPOINT ---
+def prewarm(proc: JobProcess):
+    """Load the VAD before a room is assigned, off the first-turn critical path"""
+    proc.userdata["vad"] = silero.VAD.load(min_speech_duration=0.1, min_silence_duration=0.5)
+
 async def entrypoint(ctx: JobContext):
     # Connect to the room
     await ctx.connect(auto_subscribe=True)
 
-    # Initialize data
-    userdata = SessionData()
+    # Initialize data. Only a SIP phone number is stable across calls; web
+    # participant identities are random per visit and must not key memory
+    participant = await ctx.wait_for_participant()
+    userdata = SessionData(caller_id=participant.attributes.get("sip.phoneNumber"))
 
     # Create the agent
-    agent = RazorpaySDR()
+    agent = RazorpaySDR(vad=ctx.proc.userdata["vad"])
     
     # Start the session
     session = AgentSession[SessionData](userdata=userdata)
@@ -99,6 +358,7 @@ async def entrypoint(ctx: JobContext):
 if __name__ == "__main__":
     cli.run_app(
         WorkerOptions(
-            entrypoint_fnc=entrypoint
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm
         )
     )
\ No newline at end of file
@@ -1,40 +1,78 @@
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# One pooled async client per process, reused by every query.
+# Lookup indexes are created by setup_database.py.
+_CLIENT = AsyncIOMotorClient(os.getenv("MONGODB_URI"), maxPoolSize=50)
+_DB = _CLIENT['fraud_alert_system']
+
 def get_db():
-    """Connect to the database"""
-    client = MongoClient(os.getenv("MONGODB_URI"))
-    return client['fraud_alert_system']
-
-# --- Function 1: get_user (Matches import in fraud_agent.py) ---
-def get_user(user_id):
-    """Find a user by their ID"""
-    user = get_db()["users"].find_one({"user_id": user_id})
-    if user: 
-        user.pop('_id', None) # Remove internal MongoDB ID
-    return user
-
-# --- Function 2: get_flagged_txn ---
-def get_flagged_txn(user_id):
-    """Find a flagged transaction for this user"""
-    txn = get_db()["transactions"].find_one({
-        "user_id": user_id, 
-        "status": "flagged"
-    })
-    if txn: 
-        txn.pop('_id', None)
+    """Return the shared database handle"""
+    return _DB
+
+# --- Function 1: get_user_and_flagged (Matches import in fraud_agent.py) ---
+async def get_user_and_flagged(user_id):
+    """Find a user and all of their flagged transactions in one round-trip"""
+    cursor = get_db()["users"].aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "transactions",
+            "let": {"uid": "$user_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$user_id", "$$uid"]},
+                    {"$eq": ["$status", "flagged"]},
+                ]}}},
+                {"$sort": {"timestamp": 1}},
+                {"$project": {"_id": 0}},
+            ],
+            "as": "flagged",
+        }},
+        {"$project": {"_id": 0}},  # Remove internal MongoDB ID
+    ])
+    users = await cursor.to_list(length=1)
+    if not users:
+        return None, []
+
+    user = users[0]
+    flagged = user.pop("flagged")
+    for txn in flagged:
         # Convert timestamp to string so AI can read it
         txn['timestamp'] = str(txn['timestamp'])
-    return txn
+    return user, flagged
 
-# --- Function 3: update_txn_status ---
-def update_txn_status(txn_id, status):
+# --- Function 2: update_txn_status ---
+async def update_txn_status(txn_id, status):
     """Block or Approve the transaction"""
-    get_db()["transactions"].update_one(
+    await get_db()["transactions"].update_one(
         {"transaction_id": txn_id},
         {"$set": {"status": status}}
     )
-    return True
\ No newline at end of file
+    return True
+
+# --- Function 3: get_memory ---
+async def get_memory(user_id):
+    """Load the compact structured memory kept for a bank user"""
+    memory = await get_db()["memori"].find_one(
+        {"user_id": user_id},
+        {"_id": 0, "user_id": 0},
+    )
+    return memory or {}
+
+# --- Function 4: remember_decision ---
+async def remember_decision(user_id, txn_id, decision):
+    """Record the user's latest transaction decisions"""
+    await get_db()["memori"].update_one(
+        {"user_id": user_id},
+        # Only the most recent decisions are worth re-reading on the next call
+        {"$push": {"decisions": {
+            "$each": [{"transaction_id": txn_id, "decision": decision}],
+            "$slice": -5,
+        }}},
+        upsert=True,
+    )
+    return True
@@ -1,32 +1,50 @@
+import asyncio
 import logging
 import os
 import json
-from typing import Annotated
+from dataclasses import dataclass, field
+from typing import Annotated, Optional
 from dotenv import load_dotenv
 
 from livekit.agents import (
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,
+    stt,
+    tokenize,
 )
 from livekit.agents.llm import function_tool
 from livekit.agents.voice import Agent, AgentSession, RunContext
 from livekit.plugins import deepgram, silero, openai, murf
-from database_helper import get_user, get_flagged_txn, update_txn_status
+from database_helper import get_memory, get_user_and_flagged, remember_decision, update_txn_status
 
 load_dotenv()
 logger = logging.getLogger("fraud-agent")
 logger.setLevel(logging.INFO)
+MURF_API_KEY = os.getenv("MURF_API_KEY")
 
 # --- SESSION STATE ---
+@dataclass
 class SessionData:
-    verified_user_id: str = None
+    verified_user_id: Optional[str] = None
+    # Fetched together with the user in verify_identity, oldest first
+    flagged_txns: list[dict] = field(default_factory=list)
 
 RunContext_T = RunContext[SessionData]
 
+def _describe_txn(txn: dict) -> str:
+    """The transaction details the agent reads back to the caller"""
+    return f"ID: {txn['transaction_id']}, Amount: {txn['amount']}, Merchant: {txn['merchant']}, Location: {txn['location']}."
+
+def _memory_summary(memory: dict) -> str:
+    """One short line of earlier decisions instead of replaying earlier calls"""
+    decisions = ", ".join(f"{d['transaction_id']} ({d['decision']})" for d in memory.get("decisions", []))
+    return f"Previous decisions on this account: {decisions}." if decisions else ""
+
 # --- THE AGENT CLASS ---
 class FraudDetectionAgent(Agent):
-    def __init__(self):
+    def __init__(self, vad: silero.VAD):
         super().__init__(
             instructions="""You are SecureGuard, a Fraud Detection Agent for HDFC Bank.
             Your job is to verify a high-value suspicious transaction.
@@ -38,18 +56,24 @@ class FraudDetectionAgent(Agent):
             4. Tell them: 'I see a transaction for [Amount] at [Merchant] in [Location]. Did you do this?'
             5. If NO: Use 'process_transaction' with 'block'.
             6. If YES: Use 'process_transaction' with 'approve'.
+            7. If another suspicious transaction is reported, repeat steps 4-6 for it.
             
             Keep responses short, professional, and serious.""",
             
-            # Using OpenAI STT (Network safe)
-            stt=openai.STT(),
+            # Deepgram streaming STT; falls back to OpenAI STT if Deepgram is unreachable
+            stt=stt.FallbackAdapter(
+                [deepgram.STT(model="nova-2", interim_results=True), openai.STT()],
+                vad=vad,
+            ),
             llm=openai.LLM(model="gpt-4o-mini"),
             # Murf Falcon TTS (Challenge Requirement)
             tts=murf.TTS(
                 model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
+                encoding="pcm",
+                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+                api_key=MURF_API_KEY
             ),
-            vad=silero.VAD.load(min_speech_duration=0.1)
+            vad=vad
         )
 
     # --- TOOLS ---
@@ -57,10 +81,23 @@ class FraudDetectionAgent(Agent):
     async def verify_identity(self, context: RunContext_T, user_id: Annotated[str, "The User ID provided by customer"]) -> str:
         """Verify the user exists in the bank database."""
         logger.info(f"Verifying: {user_id}")
-        user = get_user(user_id)
+        # The memori lookup runs alongside the user query, but is only surfaced once the ID is verified
+        result, memory = await asyncio.gather(
+            get_user_and_flagged(user_id), get_memory(user_id), return_exceptions=True
+        )
+        if isinstance(result, Exception):
+            raise result
+        if isinstance(memory, Exception):
+            logger.warning(f"Could not load account memory: {memory}")
+            memory = {}
+
+        user, txns = result
         if user:
             context.userdata.verified_user_id = user_id
-            return f"Identity Verified. Name: {user['name']}. Account ending in: {user['account_number'][-4:]}."
+            context.userdata.flagged_txns = txns
+            verified = f"Identity Verified. Name: {user['name']}. Account ending in: {user['account_number'][-4:]}."
+            summary = _memory_summary(memory)
+            return f"{verified} {summary}" if summary else verified
         return "User ID not found in our database."
 
     @function_tool
@@ -69,9 +106,12 @@ class FraudDetectionAgent(Agent):
         if not context.userdata.verified_user_id:
             return "Error: Please verify identity first."
             
-        txn = get_flagged_txn(context.userdata.verified_user_id)
-        if txn:
-            return f"ALERT: Suspicious transaction found! ID: {txn['transaction_id']}, Amount: {txn['amount']}, Merchant: {txn['merchant']}, Location: {txn['location']}."
+        txns = context.userdata.flagged_txns
+        if txns:
+            alert = f"ALERT: Suspicious transaction found! {_describe_txn(txns[0])}"
+            if len(txns) > 1:
+                alert += f" {len(txns) - 1} more flagged transaction(s) to review after this one."
+            return alert
         return "No suspicious activity found."
 
     @function_tool
@@ -82,13 +122,30 @@ class FraudDetectionAgent(Agent):
         decision: Annotated[str, "Decision: 'block' or 'approve'"]
     ) -> str:
         """Block or Approve the transaction based on user input."""
-        update_txn_status(transaction_id, decision)
+        await update_txn_status(transaction_id, decision)
+        context.userdata.flagged_txns = [
+            txn for txn in context.userdata.flagged_txns if txn['transaction_id'] != transaction_id
+        ]
+        if context.userdata.verified_user_id:
+            try:
+                await remember_decision(context.userdata.verified_user_id, transaction_id, decision)
+            except Exception as e:
+                logger.warning(f"Could not save account memory: {e}")
         if decision == "block":
-            return f"Transaction {transaction_id} has been BLOCKED immediately. A fraud report has been filed."
-        return f"Transaction {transaction_id} has been APPROVED. Thank you for verifying this purchase."
+            result = f"Transaction {transaction_id} has been BLOCKED immediately. A fraud report has been filed."
+        else:
+            result = f"Transaction {transaction_id} has been APPROVED. Thank you for verifying this purchase."
+        # Move straight on to the next flagged transaction, if any
+        if context.userdata.flagged_txns:
+            result += f" Next suspicious transaction to confirm: {_describe_txn(context.userdata.flagged_txns[0])}"
+        return result
 
 
 # --- ENTRYPOINT ---
+def prewarm(proc: JobProcess):
+    """Load the VAD before a room is assigned, off the first-turn critical path"""
+    proc.userdata["vad"] = silero.VAD.load(min_speech_duration=0.1)
+
 async def entrypoint(ctx: JobContext):
     # Connect to LiveKit
     await ctx.connect(auto_subscribe=True)
@@ -97,7 +154,7 @@ async def entrypoint(ctx: JobContext):
     userdata = SessionData()
 
     # Create the Agent
-    agent = FraudDetectionAgent()
+    agent = FraudDetectionAgent(vad=ctx.proc.userdata["vad"])
 
     # Start Session
     session = AgentSession[SessionData](userdata=userdata)
@@ -107,4 +164,4 @@ async def entrypoint(ctx: JobContext):
     await session.say("Hello. This is HDFC Bank Security calling. I need to verify a recent transaction. Can you please state your User ID?")
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
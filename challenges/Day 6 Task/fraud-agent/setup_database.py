@@ -59,6 +59,12 @@ def setup_sample_data():
         # Insert data
         users_collection.insert_one(sample_user)
         transactions_collection.insert_many(sample_transactions)
+
+        # Index the fields the agent looks up
+        users_collection.create_index("user_id")
+        transactions_collection.create_index([("user_id", 1), ("status", 1)])
+        transactions_collection.create_index("transaction_id")
+        db["memori"].create_index("user_id", unique=True)
         
         print("✅ Database Setup Complete!")
         print("✅ Created User: USR001 (Kaustav)")
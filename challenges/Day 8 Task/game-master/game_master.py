@@ -3,13 +3,15 @@ import os
 import json
 import random
 from typing import Annotated, List
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from dotenv import load_dotenv
 
 from livekit.agents import (
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,
+    tokenize,
 )
 from livekit.agents.llm import function_tool
 from livekit.agents.voice import Agent, AgentSession, RunContext
@@ -19,6 +21,7 @@ from livekit.plugins import deepgram, silero, openai, murf
 load_dotenv()
 logger = logging.getLogger("game-master")
 logger.setLevel(logging.INFO)
+MURF_API_KEY = os.getenv("MURF_API_KEY")
 
 # --- GAME STATE ---
 @dataclass
@@ -37,30 +40,47 @@ class GameState:
     def __post_init__(self):
         if self.character is None: self.character = Character()
     def to_json(self):
-        return json.dumps(asdict(self))
+        # Spelled out instead of asdict(), which deep-copies via dataclasses.fields() on every call
+        return json.dumps({
+            "location": self.location,
+            "turn": self.turn,
+            "character": {
+                "name": self.character.name,
+                "hp": self.character.hp,
+                "inventory": self.character.inventory,
+            },
+        })
 
 RunContext_T = RunContext[GameState]
 
+def _roll_d20() -> int:
+    """Uniform 1-20 from 5 random bits, redrawing the 12 values above 19"""
+    r = random.getrandbits(5)
+    while r >= 20:
+        r = random.getrandbits(5)
+    return r + 1
+
 # --- THE INTELLIGENT AGENT ---
 class GameMasterAgent(Agent):
-    def __init__(self):
+    def __init__(self, vad: silero.VAD):
         self.game_state = GameState()
         
         super().__init__(
-            instructions=f"""You are the Dungeon Master for a D&D fantasy adventure.
-            
-            CURRENT STATE: {self.game_state.to_json()}
+            # Static instructions so the prompt prefix never changes mid-session;
+            # the live game state is fetched with the 'check_status' tool instead
+            instructions="""You are the Dungeon Master for a D&D fantasy adventure.
             
             RULES:
             1. Describe the scene vividly but briefly (2 sentences max).
             2. Offer the player a choice.
             3. Use 'roll_dice' if the player fights, climbs, or takes risks.
             4. Use 'manage_inventory' if they pick up items.
+            5. Use 'check_status' to look up the player's location, HP, or inventory.
             
             Make it exciting!""",
             
-            # 1. HEARING: OpenAI STT (Network Friendly)
-            stt=openai.STT(),
+            # 1. HEARING: Deepgram streaming STT (interim transcripts start the LLM early)
+            stt=deepgram.STT(model="nova-2", interim_results=True),
             
             # 2. BRAIN: OpenAI GPT-4o (Smart & Creative)
             llm=openai.LLM(model="gpt-4o-mini"),
@@ -68,9 +88,11 @@ class GameMasterAgent(Agent):
             # 3. VOICE: Murf Falcon (Challenge Requirement)
             tts=murf.TTS(
                 model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
+                encoding="pcm",
+                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+                api_key=MURF_API_KEY
             ),
-            vad=silero.VAD.load(min_speech_duration=0.1)
+            vad=vad
         )
 
     async def on_enter(self) -> None:
@@ -80,10 +102,15 @@ class GameMasterAgent(Agent):
     @function_tool
     async def roll_dice(self, context: RunContext_T, action: Annotated[str, "Action description"], difficulty: int = 10) -> str:
         """Roll a D20 for risky actions."""
-        roll = random.randint(1, 20)
+        roll = _roll_d20()
         outcome = "SUCCESS" if roll >= difficulty else "FAILURE"
         return f"Rolled a {roll}. {outcome}!"
 
+    @function_tool
+    async def check_status(self, context: RunContext_T) -> str:
+        """Get the current game state: location, turn, and the character's HP and inventory."""
+        return self.game_state.to_json()
+
     @function_tool
     async def manage_inventory(self, context: RunContext_T, action: Annotated[str, "'add' or 'remove'"], item: str) -> str:
         """Add or remove items."""
@@ -98,12 +125,16 @@ class GameMasterAgent(Agent):
         return "Done."
 
 # --- ENTRYPOINT ---
+def prewarm(proc: JobProcess):
+    """Load the VAD before a room is assigned, off the first-turn critical path"""
+    proc.userdata["vad"] = silero.VAD.load(min_speech_duration=0.1)
+
 async def entrypoint(ctx: JobContext):
     await ctx.connect(auto_subscribe=True)
-    agent = GameMasterAgent()
+    agent = GameMasterAgent(vad=ctx.proc.userdata["vad"])
     session = AgentSession()
     session.userdata = agent.game_state
     await session.start(agent=agent, room=ctx.room)
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
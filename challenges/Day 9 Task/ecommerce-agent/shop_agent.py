@@ -1,61 +1,135 @@
 import logging
 import os
 import json
-from typing import Annotated, List
-from dataclasses import dataclass, asdict
+from collections import defaultdict
+from functools import lru_cache
+from typing import Annotated, List, Optional
+from dataclasses import dataclass, asdict, field
+import numpy as np
+from openai import OpenAI
 from dotenv import load_dotenv
 
 from livekit.agents import (
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,
+    tokenize,
 )
 from livekit.agents.llm import function_tool
 from livekit.agents.voice import Agent, AgentSession, RunContext
-from livekit.plugins import openai, silero, murf
+from livekit.plugins import deepgram, openai, silero, murf
 
 load_dotenv()
 logger = logging.getLogger("shop-agent")
 logger.setLevel(logging.INFO)
+MURF_API_KEY = os.getenv("MURF_API_KEY")
 
 # Load Catalog
 with open("catalog.json", "r") as f:
     CATALOG = json.load(f)
 
+# The catalog search helpers below are duplicated in "Day 7 Task/grocery-agent/grocery_agent.py"; keep both in sync.
+# Searchable text per item, embedded once per worker process in prewarm
+_SEARCH_TEXTS = [f"{item['name']} ({item['category']})" for item in CATALOG]
+EMBED_MODEL = "text-embedding-3-small"
+# Cosine floor below which a product is not considered a match at all
+MIN_MATCH_SCORE = 0.35
+# Seconds allowed for the one catalog embedding attempt in prewarm
+CATALOG_EMBED_TIMEOUT = 3.0
+
+# Lowercased names computed once for add_to_cart matching
+_CATALOG_INDEX = [(item["name"].lower(), item) for item in CATALOG]
+
+def _build_token_index() -> dict[str, list[tuple[str, dict]]]:
+    """Map every lowercased word of a catalog name to the items containing it"""
+    index = defaultdict(list)
+    for name, item in _CATALOG_INDEX:
+        for token in name.split():
+            index[token].append((name, item))
+    return dict(index)
+
+TOKEN_INDEX = _build_token_index()
+
+@lru_cache(maxsize=256)
+def _resolve(product_name: str) -> Optional[dict]:
+    """Find the catalog item for a spoken product name, whole-word matches first"""
+    query = product_name.lower().strip()
+    if not query:
+        return None
+    for name, item in TOKEN_INDEX.get(query.split()[0], ()):
+        if query in name:
+            return item
+    # Fall back to a substring scan for partial words (e.g. "egg" in "eggs")
+    for name, item in _CATALOG_INDEX:
+        if query in name:
+            return item
+    return None
+
+def _unit_rows(data) -> np.ndarray:
+    """Stack embedding results as unit-length rows so a dot product is cosine similarity"""
+    matrix = np.asarray([d.embedding for d in sorted(data, key=lambda d: d.index)], dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def _embed_catalog() -> Optional[np.ndarray]:
+    """Embed every catalog item; None leaves search on the name matcher
+
+    Runs in the synchronous prewarm, so it makes one short attempt with no
+    retries rather than risk the worker's 10s process initialization timeout.
+    """
+    try:
+        return _unit_rows(OpenAI(timeout=CATALOG_EMBED_TIMEOUT, max_retries=0).embeddings.create(input=_SEARCH_TEXTS, model=EMBED_MODEL).data)
+    except Exception as e:
+        logger.warning(f"Catalog embedding failed, search will use name matching: {e}")
+        return None
+
+async def _search_catalog(query: str, catalog_embeddings: Optional[np.ndarray], top_k: int = 5) -> list[dict]:
+    """Return up to top_k catalog items similar enough to the query"""
+    if catalog_embeddings is None:
+        item = _resolve(query)
+        return [item] if item else []
+    query_embedding = _unit_rows(await openai.create_embeddings(input=[query], model=EMBED_MODEL))[0]
+    scores = catalog_embeddings @ query_embedding
+    return [CATALOG[i] for i in np.argsort(-scores)[:top_k] if scores[i] >= MIN_MATCH_SCORE]
+
 # --- SESSION STATE ---
+@dataclass
 class SessionData:
-    cart: list = []
+    cart: list = field(default_factory=list)
+    # Running bill and spoken line items, kept up to date by add_to_cart
+    total: int = 0
+    summary_parts: list[str] = field(default_factory=list)
 
 RunContext_T = RunContext[SessionData]
 
 # --- THE AGENT ---
 class ShopAgent(Agent):
-    def __init__(self):
+    def __init__(self, vad: silero.VAD, catalog_embeddings: Optional[np.ndarray] = None):
         super().__init__(
             # UPDATED INSTRUCTIONS FOR GROCERY CONTEXT
             instructions="""You are 'Grocer', a helpful Quick Commerce assistant (like Zepto/Blinkit).
             
             GOAL: Help customers order groceries and snacks.
             
-            CATALOG:
-            """ + json.dumps(CATALOG) + """
-            
             RULES:
             1. Keep answers short (1 sentence).
-            2. If they ask for an item, check if it's in the catalog.
+            2. If they ask for an item, use 'search_products' to find it. Only offer products it returns.
             3. Use 'add_to_cart' to add items.
             4. Use 'checkout' to finish.
             
             Be enthusiastic about food!""",
             
-            stt=openai.STT(),
+            stt=deepgram.STT(model="nova-2", interim_results=True),
             llm=openai.LLM(model="gpt-4o-mini"),
             tts=murf.TTS(
                 model="FALCON",
-                api_key=os.getenv("MURF_API_KEY")
+                encoding="pcm",
+                tokenizer=tokenize.basic.SentenceTokenizer(min_sentence_len=2),
+                api_key=MURF_API_KEY
             ),
-            vad=silero.VAD.load(min_speech_duration=0.1)
+            vad=vad
         )
+        self._catalog_embeddings = catalog_embeddings
 
     async def on_enter(self) -> None:
         await self.session.say("Hi! Welcome to QuickMart. I can help you with groceries. What do you need?")
@@ -71,33 +145,60 @@ class ShopAgent(Agent):
         if not items: return "Sorry, we don't have that category."
         return f"Available: {', '.join([i['name'] + ' (' + str(i['price']) + ')' for i in items])}"
 
+    @function_tool
+    async def search_products(self, context: RunContext_T, query: Annotated[str, "What the customer is looking for"]) -> str:
+        """Find the products that best match what the customer asked for."""
+        try:
+            items = await _search_catalog(query, self._catalog_embeddings)
+        except Exception as e:
+            logger.warning(f"Product search failed, falling back to name match: {e}")
+            item = _resolve(query)
+            items = [item] if item else []
+
+        if not items:
+            return "Sorry, we don't have anything like that."
+        return f"Matches: {', '.join(i['name'] + ' (' + str(i['price']) + ' Rupees)' for i in items)}"
+
     @function_tool
     async def add_to_cart(self, context: RunContext_T, product_name: str, quantity: int) -> str:
         """Add item to cart."""
-        for item in CATALOG:
-            # Fuzzy match (e.g. "Milk" matches "Fresh Milk")
-            if product_name.lower() in item["name"].lower():
-                context.userdata.cart.append({"item": item["name"], "qty": quantity, "price": item["price"]})
-                return f"Added {quantity} {item['name']} to cart."
+        # Fuzzy match (e.g. "Milk" matches "Fresh Milk")
+        item = _resolve(product_name)
+        if item:
+            context.userdata.cart.append({"item": item["name"], "qty": quantity, "price": item["price"]})
+            context.userdata.total += quantity * item["price"]
+            context.userdata.summary_parts.append(f"{quantity}x {item['name']}")
+            return f"Added {quantity} {item['name']} to cart."
         return f"Sorry, we don't have {product_name} in stock."
 
     @function_tool
     async def checkout(self, context: RunContext_T) -> str:
         """Finalize order."""
         if not context.userdata.cart: return "Cart is empty."
-        total = sum([i['qty'] * i['price'] for i in context.userdata.cart])
-        order_summary = ", ".join([f"{i['qty']}x {i['item']}" for i in context.userdata.cart])
+        total = context.userdata.total
+        order_summary = ", ".join(context.userdata.summary_parts)
         
-        context.userdata.cart = [] # Clear
+        # Clear cart
+        context.userdata.cart = []
+        context.userdata.total = 0
+        context.userdata.summary_parts = []
         return f"Order Confirmed! items: {order_summary}. Total Bill: {total} Rupees. Arriving in 10 minutes!"
 
 # --- ENTRYPOINT ---
+def prewarm(proc: JobProcess):
+    """Load the VAD and catalog embeddings before a room is assigned, off the first-turn critical path"""
+    proc.userdata["vad"] = silero.VAD.load(min_speech_duration=0.1)
+    proc.userdata["catalog_embeddings"] = _embed_catalog()
+
 async def entrypoint(ctx: JobContext):
     await ctx.connect(auto_subscribe=True)
     userdata = SessionData()
-    agent = ShopAgent()
+    agent = ShopAgent(
+        vad=ctx.proc.userdata["vad"],
+        catalog_embeddings=ctx.proc.userdata["catalog_embeddings"],
+    )
     session = AgentSession(userdata=userdata)
     await session.start(agent=agent, room=ctx.room)
 
 if __name__ == "__main__":
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file